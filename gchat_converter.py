@@ -14,19 +14,29 @@ from collections import defaultdict
 from collections.abc import Generator
 from contextlib import contextmanager
 from pathlib import Path
-from typing import Optional, TextIO
+from typing import Callable, Optional, TextIO
 
-from util import USER_COLORS, Group, GroupInfo, SomePath, SummaryData, User
+from util import (
+    USER_COLORS,
+    Group,
+    GroupInfo,
+    Message,
+    SomePath,
+    SummaryData,
+    User,
+    file_size,
+)
 
 
-def make_summary_data(
+def discover_groups(
     search_path: SomePath,
     group_filter_strict: bool,
     group_filter: set[str],
     sender_filter: set[str],
-) -> SummaryData:
+) -> list[Group]:
+    # Only reads group_info.json files; messages.json is left alone so this
+    # stays fast even on huge exports.
     groups = list[Group]()
-    usercounts = defaultdict[str, int](int)
     groups_path = search_path / "Groups"
     if not (groups_path.exists() and groups_path.is_dir()):
         raise Exception(
@@ -56,28 +66,77 @@ def make_summary_data(
             if not sender_filter.intersection(group.members.keys()):
                 continue
 
+        msgs_path = group.messages_path(search_path)
+        if msgs_path.exists() and msgs_path.is_file():
+            group.messages_size = file_size(msgs_path)
+
         groups.append(group)
 
-        # Scan messages
-        msgs = group.load_messages(search_path)
-        for msg in msgs:
-            em = msg.creator.email.lower()
+    return groups
+
+
+def count_group_messages(
+    group: Group, msgs: list[Message], sender_filter: set[str]
+) -> None:
+    # Counts from scratch, so this is safe to call again on a group whose
+    # messages have been reloaded.
+    group.count = 0
+    group.usercounts.clear()
+
+    for msg in msgs:
+        em = msg.creator.email.lower()
+
+        # Apply sender filter here
+        if sender_filter:
+            if em not in sender_filter:
+                continue
+
+        if em not in group.members:
+            # This seems to happen ... maybe this person has left the group?
+            group.add_member(msg.creator)
+        group.usercounts[em] += 1
+        group.count += 1
 
-            # Apply sender filter here
-            if sender_filter:
-                if em not in sender_filter:
-                    continue
 
-            if em not in group.members:
-                # This seems to happen ... maybe this person has left the group?
-                group.add_member(msg.creator)
-            group.usercounts[em] += 1
-            group.count += 1
-            usercounts[em] += 1
+def count_messages(
+    search_path: SomePath,
+    groups: list[Group],
+    sender_filter: set[str],
+) -> SummaryData:
+    usercounts = defaultdict[str, int](int)
+
+    for group in groups:
+        msgs = group.load_messages(search_path)
+        count_group_messages(group, msgs, sender_filter)
+        for em, count in group.usercounts.items():
+            usercounts[em] += count
 
     return SummaryData(groups, usercounts)
 
 
+def make_summary_data(
+    search_path: SomePath,
+    group_filter_strict: bool,
+    group_filter: set[str],
+    sender_filter: set[str],
+) -> SummaryData:
+    groups = discover_groups(
+        search_path, group_filter_strict, group_filter, sender_filter
+    )
+    return count_messages(search_path, groups, sender_filter)
+
+
+def write_group_list(groups: list[Group], outfile: TextIO) -> None:
+    print("====== CHATS ======", file=outfile)
+    for group in groups:
+        print(
+            f" - {group.name} ({', '.join(group.members.keys())})",
+            file=outfile,
+        )
+        print(f"   {group.messages_size:,} bytes of messages", file=outfile)
+    print(file=outfile)
+
+
 def write_summary(data: SummaryData, outfile: TextIO) -> None:
     groups, usercounts = data
 
@@ -120,26 +179,35 @@ def build_css() -> str:
     return result
 
 
+def write_html_head(f: TextIO) -> None:
+    p = functools.partial(print, file=f)
+    p("<!DOCTYPE html>")
+    p('<html lang="en">')
+    p("  <head>")
+    p('    <meta charset="utf-8">')
+    p("    <style>")
+    p(build_css())
+    p("    </style>")
+    p("  </head>")
+    p("  <body>")
+    p()
+
+
+def write_html_tail(f: TextIO) -> None:
+    p = functools.partial(print, file=f)
+    p()
+    p("  </body>")
+    p("</html>")
+
+
 @contextmanager
 def htmlfile(path: Path) -> Generator[TextIO, None, None]:
     f = path.open("w", encoding="utf-8")
     try:
-        p = functools.partial(print, file=f)
-        p("<!DOCTYPE html>")
-        p('<html lang="en">')
-        p("  <head>")
-        p('    <meta charset="utf-8">')
-        p("    <style>")
-        p(build_css())
-        p("    </style>")
-        p("  </head>")
-        p("  <body>")
-        p()
+        write_html_head(f)
         yield f
     finally:
-        p()
-        p("  </body>")
-        p("</html>")
+        write_html_tail(f)
         f.close()
 
 
@@ -151,6 +219,113 @@ def username_html(u: User, g: Group) -> str:
     )
 
 
+def msg_months(msgs: list[Message]) -> list[tuple[int, int]]:
+    return sorted(
+        set(
+            (m.created_date.year, m.created_date.month)
+            for m in msgs
+            if m.created_date
+        )
+    )
+
+
+def write_group_header(
+    group: Group,
+    months: list[tuple[int, int]],
+    month_href: Callable[[tuple[int, int]], str],
+    ghtml: TextIO,
+) -> None:
+    gout = functools.partial(print, file=ghtml)
+
+    gout(f'<h1 id="top">Chat: {html.escape(group.name)}</h1>')
+    if group.first_msg_time:
+        gout(
+            f"<p>From {html.escape(str(group.first_msg_time))} to {html.escape(str(group.last_msg_time))}"
+        )
+    gout("<h2>Members</h2>")
+
+    # Print members list
+    gout("<ul>")
+    for m in group.members.values():
+        gout("<li>")
+        gout(username_html(m, group))
+        gout(
+            f"({html.escape(m.name)}): {group.usercounts[m.email.lower()]} messages"
+        )
+    gout("</ul>")
+
+    gout("<h2>Month Index</h2>")
+    gout("<p>")
+    prev_year = None
+    for month in months:
+        # One line per year...
+        if prev_year and month[0] != prev_year:
+            gout("<br>")
+        prev_year = month[0]
+
+        gout(f'<a href="{html.escape(month_href(month), quote=True)}">')
+        gout(f"{month[0]}-{month[1]}")
+        gout("</a>&centerdot;")
+
+
+def write_group_messages(
+    group: Group, msgs: list[Message], ghtml: TextIO
+) -> None:
+    gout = functools.partial(print, file=ghtml)
+
+    # Print basic read-out of the chat
+    gout("<h1>Messages</h1>")
+    prev_date: Optional[datetime.date] = None
+    prev_month: Optional[tuple[int, int]] = None
+    for msg in msgs:
+        # Update date stuff
+        if msg.created_date:
+            cur_date = msg.created_date.date()
+            cur_month = (cur_date.year, cur_date.month)
+            if not prev_date or cur_date != prev_date:
+                if not prev_month or cur_month != prev_month:
+                    gout(f'<h3 id="{cur_month[0]}-{cur_month[1]}">')
+                    gout('<a href="#top">&uarr;</a>')
+                    gout(f"{cur_month[0]}-{cur_month[1]}")
+                    gout("</h3>")
+                gout(f'<h4 id="{html.escape(str(cur_date), quote=True)}">')
+                gout(html.escape(str(cur_date)))
+                gout("</h4>")
+            prev_date = cur_date
+            prev_month = cur_month
+
+        gout("<p>")
+        gout(username_html(msg.creator, group))
+        gout(": " + html.escape(msg.text))
+        gout("<br>")
+        gout('<span class="details">')
+        if msg.created_date:
+            gout(html.escape(msg.created_date.isoformat()))
+        if msg.has_annotations:
+            gout(" (message included images or other non-text data)")
+        gout("</span>")
+
+
+def write_index(groups: list[Group], ihtml: TextIO) -> None:
+    iout = functools.partial(print, file=ihtml)
+    iout("<h1>Chats</h1>")
+    iout("<ul>")
+    for i in range(len(groups)):
+        g = groups[i]
+        iout(f'<li><a href="g{i}.html">' + html.escape(g.name) + "</a>")
+        iout("<ul>")
+        for m in g.members.values():
+            iout(
+                "<li>"
+                + html.escape(m.email)
+                + " ("
+                + html.escape(m.name)
+                + ")</i>"
+            )
+        iout("</ul>")
+    iout("</ul>")
+
+
 def write_html(
     search_path: SomePath,
     sender_filter: set[str],
@@ -166,97 +341,17 @@ def write_html(
         msgs = group.load_messages(search_path)
 
         with htmlfile(outpath / f"g{i}.html") as ghtml:
-            gout = functools.partial(print, file=ghtml)
-
-            gout(f'<h1 id="top">Chat: {html.escape(group.name)}</h1>')
-            if group.first_msg_time:
-                gout(
-                    f"<p>From {html.escape(str(group.first_msg_time))} to {html.escape(str(group.last_msg_time))}"
-                )
-            gout("<h2>Members</h2>")
-
-            # Print members list
-            gout("<ul>")
-            for m in group.members.values():
-                gout("<li>")
-                gout(username_html(m, group))
-                gout(
-                    f"({html.escape(m.name)}): {group.usercounts[m.email.lower()]} messages"
-                )
-            gout("</ul>")
-
-            # Find all months present
-            months = set(
-                (m.created_date.year, m.created_date.month)
-                for m in msgs
-                if m.created_date
+            write_group_header(
+                group,
+                msg_months(msgs),
+                lambda month: f"#{month[0]}-{month[1]}",
+                ghtml,
             )
-            gout("<h2>Month Index</h2>")
-            gout("<p>")
-            prev_year = None
-            for month in months:
-                # One line per year...
-                if prev_year and month[0] != prev_year:
-                    gout("<br>")
-                prev_year = month[0]
-
-                gout(f'<a href="#{month[0]}-{month[1]}">')
-                gout(f"{month[0]}-{month[1]}")
-                gout("</a>&centerdot;")
-
-            # Print basic read-out of the chat
-            gout("<h1>Messages</h1>")
-            prev_date: Optional[datetime.date] = None
-            prev_month: Optional[tuple[int, int]] = None
-            for msg in msgs:
-                # Update date stuff
-                if msg.created_date:
-                    cur_date = msg.created_date.date()
-                    cur_month = (cur_date.year, cur_date.month)
-                    if not prev_date or cur_date != prev_date:
-                        if not prev_month or cur_month != prev_month:
-                            gout(f'<h3 id="{cur_month[0]}-{cur_month[1]}">')
-                            gout('<a href="#top">&uarr;</a>')
-                            gout(f"{cur_month[0]}-{cur_month[1]}")
-                            gout("</h3>")
-                        gout(
-                            f'<h4 id="{html.escape(str(cur_date), quote=True)}">'
-                        )
-                        gout(html.escape(str(cur_date)))
-                        gout("</h4>")
-                    prev_date = cur_date
-                    prev_month = cur_month
-
-                gout("<p>")
-                gout(username_html(msg.creator, group))
-                gout(": " + html.escape(msg.text))
-                gout("<br>")
-                gout('<span class="details">')
-                if msg.created_date:
-                    gout(html.escape(msg.created_date.isoformat()))
-                if msg.has_annotations:
-                    gout(" (message included images or other non-text data)")
-                gout("</span>")
+            write_group_messages(group, msgs, ghtml)
 
     # Now write the index
     with htmlfile(outpath / "index.html") as ihtml:
-        iout = functools.partial(print, file=ihtml)
-        iout("<h1>Chats</h1>")
-        iout("<ul>")
-        for i in range(len(summary.groups)):
-            g = summary.groups[i]
-            iout(f'<li><a href="g{i}.html">' + html.escape(g.name) + "</a>")
-            iout("<ul>")
-            for m in g.members.values():
-                iout(
-                    "<li>"
-                    + html.escape(m.email)
-                    + " ("
-                    + html.escape(m.name)
-                    + ")</i>"
-                )
-            iout("</ul>")
-        iout("</ul>")
+        write_index(summary.groups, ihtml)
 
 
 def get_search_path(in_path: Path) -> SomePath:
@@ -296,7 +391,7 @@ if __name__ == "__main__":
         action="store",
         help="output format",
         default="html",
-        choices=["html", "summarize"],
+        choices=["html", "summarize", "list"],
     )
     argparser.add_argument(
         "--only-chats-with",
@@ -315,6 +410,27 @@ if __name__ == "__main__":
         nargs="*",
         default=[],
     )
+    argparser.add_argument(
+        "--serve",
+        help="Instead of converting, serve chats over HTTP, rendering on demand",
+        action="store_true",
+        default=False,
+    )
+    argparser.add_argument(
+        "--port",
+        help="port for --serve",
+        action="store",
+        type=int,
+        default=8000,
+    )
+    argparser.add_argument(
+        "--cache-mb",
+        help="approximate memory cap for chats kept loaded by --serve, "
+        "estimated from message file sizes; parsing can briefly use more",
+        action="store",
+        type=int,
+        default=256,
+    )
 
     args = argparser.parse_args()
 
@@ -327,7 +443,18 @@ if __name__ == "__main__":
     group_filter = set(g.lower() for g in args.only_chats_with)
     sender_filter = set(s.lower() for s in args.only_senders)
 
-    if args.format == "html":
+    if args.serve:
+        # Only needed here, and it imports this module
+        import gchat_server
+
+        groups = discover_groups(
+            search_path, args.chat_filter_exclusive, group_filter, sender_filter
+        )
+        gchat_server.serve(
+            search_path, groups, sender_filter, args.port, args.cache_mb
+        )
+
+    elif args.format == "html":
         if not args.output:
             print("--output required for --format html", sys.stderr)
             sys.exit(1)
@@ -360,3 +487,14 @@ if __name__ == "__main__":
             search_path, args.chat_filter_exclusive, group_filter, sender_filter
         )
         write_summary(summary_data, outfile)
+
+    elif args.format == "list":
+        if args.output:
+            outfile = open(args.output, "w", encoding="utf-8")
+        else:
+            outfile = sys.stdout
+
+        groups = discover_groups(
+            search_path, args.chat_filter_exclusive, group_filter, sender_filter
+        )
+        write_group_list(groups, outfile)
@@ -50,13 +50,14 @@ def load():
     strio = io.StringIO()
     with controls_disabled():
         try:
-            global group_filter, sender_filter, summary_data
+            global sender_filter, groups
             group_filter = _cleanup_filter(gfe_var.get())
             sender_filter = _cleanup_filter(sfe_var.get())
-            summary_data = gchat_converter.make_summary_data(
+            # Just the group metadata here; messages get read when generating
+            groups = gchat_converter.discover_groups(
                 search_path, gfch_var.get(), group_filter, sender_filter
             )
-            gchat_converter.write_summary(summary_data, strio)
+            gchat_converter.write_group_list(groups, strio)
 
             # Now show relevant controls
             gfe_label.grid(row=1, column=0)
@@ -76,14 +77,14 @@ def load():
                 t["state"] = "disabled"
 
         except Exception as e:
-            logging.exception("Error generating summary")
+            logging.exception("Error listing chats")
             tkinter.messagebox.showerror(title="oops", message=str(e))
 
 
 def gen_html():
-    if "summary_data" not in globals():
+    if "groups" not in globals():
         tkinter.messagebox.showerror(
-            title="oops", message="Hmm, better generate summary first"
+            title="oops", message="Hmm, better load some chats first"
         )
         return
 
@@ -108,6 +109,10 @@ def gen_html():
                     ):
                         shutil.rmtree(outpath)
 
+            # Full scan happens here, only for the chats that were listed
+            summary_data = gchat_converter.count_messages(
+                search_path, groups, sender_filter
+            )
             gchat_converter.write_html(
                 search_path, sender_filter, outpath, summary_data
             )
@@ -0,0 +1,291 @@
+import asyncio
+import html
+import io
+import logging
+import re
+from collections import OrderedDict
+from typing import Optional
+
+import gchat_converter
+from util import Group, Message, SomePath
+
+# Index, group landing page (first month), or one month of a group
+ROUTE_RE = re.compile(r"^/(?:index\.html)?$|^/g(\d+)(?:-(\d+)-(\d+))?\.html$")
+
+# Parsed messages take up about this many times their messages.json size
+# (measured on a 100k message chat; parsing briefly peaks higher)
+PARSED_SIZE_FACTOR = 2
+
+
+def split_by_month(
+    msgs: list[Message],
+) -> OrderedDict[tuple[int, int], list[Message]]:
+    # Messages without a date stay with whatever month they're sitting in;
+    # any before the first dated message go with the first month.
+    pages = OrderedDict[tuple[int, int], list[Message]]()
+    cur_month: Optional[tuple[int, int]] = None
+    pending = list[Message]()
+    for msg in msgs:
+        if msg.created_date:
+            cur_month = (msg.created_date.year, msg.created_date.month)
+        if cur_month is None:
+            pending.append(msg)
+            continue
+        page = pages.setdefault(cur_month, [])
+        if pending:
+            page.extend(pending)
+            pending.clear()
+        page.append(msg)
+
+    return pages
+
+
+class LoadedGroup:
+    def __init__(self, msgs: list[Message]):
+        super().__init__()
+        self.msgs = msgs
+        self.pages = split_by_month(msgs)
+        self.months = sorted(self.pages.keys())
+
+
+# LRU of parsed groups. Memory use is capped approximately, estimating each
+# group's size from its messages.json.
+class GroupCache:
+    def __init__(
+        self,
+        search_path: SomePath,
+        groups: list[Group],
+        sender_filter: set[str],
+        max_bytes: int,
+    ):
+        super().__init__()
+        self.search_path = search_path
+        self.groups = groups
+        self.sender_filter = sender_filter
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.entries = OrderedDict[int, LoadedGroup]()
+
+        # So concurrent requests for one group only parse it once
+        self.loading = dict[int, asyncio.Future[LoadedGroup]]()
+
+    def weight(self, idx: int) -> int:
+        return self.groups[idx].messages_size * PARSED_SIZE_FACTOR
+
+    def _load(self, idx: int) -> LoadedGroup:
+        # Runs in a worker thread, so mustn't touch anything the event loop
+        # might be reading, like group.members
+        return LoadedGroup(self.groups[idx].load_messages(self.search_path))
+
+    async def get(self, idx: int) -> LoadedGroup:
+        if idx in self.entries:
+            self.entries.move_to_end(idx)
+            return self.entries[idx]
+        if idx in self.loading:
+            return await self.loading[idx]
+
+        fut = asyncio.get_running_loop().create_future()
+        self.loading[idx] = fut
+        try:
+            # JSON parsing is slow for big chats; keep it off the event loop
+            loaded = await asyncio.to_thread(self._load, idx)
+            gchat_converter.count_group_messages(
+                self.groups[idx], loaded.msgs, self.sender_filter
+            )
+            fut.set_result(loaded)
+        except Exception as e:
+            fut.set_exception(e)
+            # Nobody else may be waiting; don't warn about it
+            fut.exception()
+            raise
+        finally:
+            del self.loading[idx]
+            # e.g. cancelled; don't leave other requests hanging
+            if not fut.done():
+                fut.cancel()
+
+        self.entries[idx] = loaded
+        self.size += self.weight(idx)
+
+        # Always keep the group we just loaded, even if it's over the cap
+        while self.size > self.max_bytes and len(self.entries) > 1:
+            old_idx, _ = self.entries.popitem(last=False)
+            self.size -= self.weight(old_idx)
+            logging.info("Evicted %s from cache", self.groups[old_idx].name)
+
+        return loaded
+
+
+class ChatServer:
+    def __init__(self, cache: GroupCache):
+        super().__init__()
+        self.cache = cache
+
+    async def handle(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        try:
+            request_line = await reader.readline()
+            # Don't care about headers, but read past them
+            while (await reader.readline()).strip():
+                pass
+
+            parts = request_line.decode("latin-1").split()
+            if len(parts) < 2:
+                return
+            method, target = parts[0], parts[1].split("?", 1)[0]
+            if method != "GET":
+                await self.send_error(writer, 405, "Method Not Allowed")
+                return
+
+            match = ROUTE_RE.match(target)
+            if not match:
+                await self.send_error(writer, 404, "Not Found")
+                return
+
+            if match.group(1) is None:
+                await self.send_index(writer)
+            else:
+                idx = int(match.group(1))
+                month = (
+                    (int(match.group(2)), int(match.group(3)))
+                    if match.group(2)
+                    else None
+                )
+                await self.send_group(writer, idx, month)
+
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        except Exception:
+            logging.exception("Error handling request")
+        finally:
+            writer.close()
+
+    async def send_headers(
+        self, writer: asyncio.StreamWriter, status: int, reason: str
+    ) -> None:
+        # No Content-Length: the body is streamed and the connection closed
+        # when it's done.
+        writer.write(
+            (
+                f"HTTP/1.1 {status} {reason}\r\n"
+                "Content-Type: text/html; charset=utf-8\r\n"
+                "Connection: close\r\n"
+                "\r\n"
+            ).encode("utf-8")
+        )
+        await writer.drain()
+
+    async def send_error(
+        self, writer: asyncio.StreamWriter, status: int, reason: str
+    ) -> None:
+        await self.send_headers(writer, status, reason)
+        writer.write(f"<h1>{status} {reason}</h1>\n".encode("utf-8"))
+        await writer.drain()
+
+    async def send_index(self, writer: asyncio.StreamWriter) -> None:
+        await self.send_headers(writer, 200, "OK")
+        out = io.StringIO()
+        gchat_converter.write_html_head(out)
+        gchat_converter.write_index(self.cache.groups, out)
+        gchat_converter.write_html_tail(out)
+        writer.write(out.getvalue().encode("utf-8"))
+        await writer.drain()
+
+    async def flush(
+        self, writer: asyncio.StreamWriter, out: io.StringIO
+    ) -> None:
+        writer.write(out.getvalue().encode("utf-8"))
+        out.seek(0)
+        out.truncate()
+        await writer.drain()
+
+    async def send_group(
+        self,
+        writer: asyncio.StreamWriter,
+        idx: int,
+        month: Optional[tuple[int, int]],
+    ) -> None:
+        if idx >= len(self.cache.groups):
+            await self.send_error(writer, 404, "Not Found")
+            return
+        group = self.cache.groups[idx]
+
+        # If the group is already parsed, a bad month can still get a real 404
+        cached = self.cache.entries.get(idx)
+        if cached and month is not None and month not in cached.pages:
+            await self.send_error(writer, 404, "Not Found")
+            return
+
+        # Get the first bytes out before parsing, which can take a while
+        await self.send_headers(writer, 200, "OK")
+        out = io.StringIO()
+        gchat_converter.write_html_head(out)
+        await self.flush(writer, out)
+
+        try:
+            loaded = await self.cache.get(idx)
+        except Exception as e:
+            # Too late for an error status; put the error in the page instead
+            logging.exception("Error loading %s", group.name)
+            out.write(
+                f"<h1>Error loading chat: {html.escape(group.name)}</h1>\n"
+            )
+            out.write(f"<p>{html.escape(str(e))}\n")
+            gchat_converter.write_html_tail(out)
+            await self.flush(writer, out)
+            return
+
+        msgs: Optional[list[Message]]
+        if month is None:
+            msgs = next(iter(loaded.pages.values()), loaded.msgs)
+        else:
+            msgs = loaded.pages.get(month)
+
+        gchat_converter.write_group_header(
+            group,
+            loaded.months,
+            lambda m: f"g{idx}-{m[0]}-{m[1]}.html",
+            out,
+        )
+        out.write('<p><a href="index.html">All chats</a>\n')
+        await self.flush(writer, out)
+
+        if msgs is None:
+            assert month
+            out.write(f"<p>No such month: {month[0]}-{month[1]}\n")
+        else:
+            gchat_converter.write_group_messages(group, msgs, out)
+        gchat_converter.write_html_tail(out)
+        await self.flush(writer, out)
+
+
+async def run_server(
+    search_path: SomePath,
+    groups: list[Group],
+    sender_filter: set[str],
+    port: int,
+    cache_mb: int,
+) -> None:
+    cache = GroupCache(search_path, groups, sender_filter, cache_mb * 1024**2)
+    server = await asyncio.start_server(
+        ChatServer(cache).handle, "127.0.0.1", port
+    )
+    print(f"Serving {len(groups)} chats at http://127.0.0.1:{port}/")
+    async with server:
+        await server.serve_forever()
+
+
+def serve(
+    search_path: SomePath,
+    groups: list[Group],
+    sender_filter: set[str],
+    port: int,
+    cache_mb: int,
+) -> None:
+    try:
+        asyncio.run(
+            run_server(search_path, groups, sender_filter, port, cache_mb)
+        )
+    except KeyboardInterrupt:
+        pass
@@ -28,6 +28,15 @@ USER_COLORS = (
     "olive",
 )
 
+
+def file_size(path: SomePath) -> int:
+    # For zips, read the size from the central directory rather than opening
+    # the member.
+    if isinstance(path, zipfile.Path):
+        return path.root.getinfo(path.at).file_size
+    return path.stat().st_size
+
+
 # Seen in various places
 class UserInfo(TypedDict):
     name: str
@@ -95,6 +104,10 @@ class Group:
             for i in range(len(json_group["members"]))
         }
         self.count = 0
+
+        # Size in bytes of messages.json, a cheap stand-in for message volume
+        # when the messages haven't been loaded.
+        self.messages_size = 0
         self.first_msg_time = None
         self.last_msg_time = None
 
@@ -110,8 +123,11 @@ class Group:
     def get_idx(self, u: User) -> int:
         return self.user_idxs.get(u.email.lower(), 0)
 
+    def messages_path(self, search_path: SomePath) -> SomePath:
+        return search_path / "Groups" / self.key / "messages.json"
+
     def load_messages(self, search_path: SomePath) -> list[Message]:
-        msgs_path = search_path / "Groups" / self.key / "messages.json"
+        msgs_path = self.messages_path(search_path)
         if msgs_path.exists() and msgs_path.is_file():
             with msgs_path.open("r", encoding="utf-8") as msgs_file:
                 msg_file: MessageFile = json.load(msgs_file)